@@ -6,6 +6,8 @@ import tempfile
 import shutil
 from bs4 import BeautifulSoup
 
+from llmtest_perf import trace
+
 # --- 1. 爬虫部分：解析HTML报告 ---
 def parse_html_report(html_file_path):
     """
@@ -18,8 +20,7 @@ def parse_html_report(html_file_path):
     dict: 包含错误信息的字典，如果找不到则返回None。
     """
     try:
-        with open(html_file_path, 'r', encoding='utf-8') as f:
-            soup = BeautifulSoup(f, 'html.parser')
+        soup = _load_html(html_file_path)
         
         # 使用CSS选择器定位第一个错误区域
         error_section = soup.select_one('div.error-section')
@@ -27,28 +28,74 @@ def parse_html_report(html_file_path):
             print("错误: 未在HTML报告中找到 '.error-section' 区域。")
             return None
         
-        # 在错误区域内提取具体信息
-        file_path_tag = error_section.select_one('p.file-path')
-        line_number_tag = error_section.select_one('p.line-number')
-        error_code_tag = error_section.select_one('p.error-code')
-
-        if not all([file_path_tag, line_number_tag, error_code_tag]):
+        error_info = _parse_error_section(error_section)
+        if not error_info:
             print("错误: 报告中缺少关键信息（文件路径、行号或错误代号）。")
             return None
 
-        file_path = file_path_tag.text.strip()
-        line_number = int(line_number_tag.text.strip())
-        error_code = error_code_tag.text.strip()
-        
-        return {
-            'file_path': file_path,
-            'line_number': line_number,
-            'error_code': error_code
-        }
+        return error_info
     except Exception as e:
         print(f"解析HTML报告时出错: {e}")
         return None
 
+def parse_html_report_all(html_file_path):
+    """
+    解析HTML测试报告中的所有错误区域。
+
+    参数:
+    html_file_path (str): HTML报告文件的路径。
+
+    返回:
+    list: 错误信息字典的列表，缺少关键信息的区域会被跳过。
+    """
+    try:
+        soup = _load_html(html_file_path)
+    except Exception as e:
+        print(f"解析HTML报告时出错: {e}")
+        return []
+
+    findings = []
+    for error_section in soup.select('div.error-section'):
+        try:
+            error_info = _parse_error_section(error_section)
+        except ValueError:
+            error_info = None
+        if error_info:
+            findings.append(error_info)
+    return findings
+
+def _load_html(html_file_path):
+    """
+    读取并解析HTML报告，返回BeautifulSoup对象。
+    """
+    with trace.span("html.parse", file=html_file_path):
+        with open(html_file_path, 'rb') as f:
+            data = f.read()
+        trace.count("bytes_read", len(data))
+        return BeautifulSoup(data.decode('utf-8'), 'html.parser')
+
+def _parse_error_section(error_section):
+    """
+    从一个 '.error-section' 区域中提取文件路径、行号和错误代号，缺少任一项时返回None。
+    """
+    # 在错误区域内提取具体信息
+    file_path_tag = error_section.select_one('p.file-path')
+    line_number_tag = error_section.select_one('p.line-number')
+    error_code_tag = error_section.select_one('p.error-code')
+
+    if not all([file_path_tag, line_number_tag, error_code_tag]):
+        return None
+
+    file_path = file_path_tag.text.strip()
+    line_number = int(line_number_tag.text.strip())
+    error_code = error_code_tag.text.strip()
+
+    return {
+        'file_path': file_path,
+        'line_number': line_number,
+        'error_code': error_code
+    }
+
 # --- 2. AST部分：使用Clang AST提取函数代码 ---
 def find_function_in_ast(ast_node, original_file_path, target_line):
     """
@@ -99,9 +146,14 @@ def extract_function_with_clang_ast(original_file_path, target_line):
             original_file_path
         ]
         
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        json_output = re.search(r'^\s*\{.*\}\s*$', result.stdout, re.DOTALL).group(0)
-        ast = json.loads(json_output)
+        with trace.span("clang.subprocess", file=original_file_path):
+            result = subprocess.run(command, capture_output=True, text=True, check=True)
+        trace.count("files_parsed")
+        # clang 的输出不是从磁盘读取的, 单独计数
+        trace.count("clang_output_bytes", len(result.stdout.encode('utf-8')))
+        with trace.span("json.load", file=original_file_path):
+            json_output = re.search(r'^\s*\{.*\}\s*$', result.stdout, re.DOTALL).group(0)
+            ast = json.loads(json_output)
         
         function_node = find_function_in_ast(ast, original_file_path, target_line)
         
@@ -112,6 +164,8 @@ def extract_function_with_clang_ast(original_file_path, target_line):
             
             with open(original_file_path, 'r', encoding='utf-8') as f:
                 lines = f.readlines()
+                # utf-8 文本文件的 tell() 即已读取的字节数
+                trace.count("bytes_read", f.tell())
             
             function_code = "".join(lines[start_line - 1: end_line])
             return function_code
@@ -140,26 +194,27 @@ def insert_comment_into_file(file_path, line_number, comment):
     bool: 成功返回True，否则返回False。
     """
     try:
-        with open(file_path, 'r+', encoding='utf-8') as f:
+        with trace.span("file.rewrite", file=file_path), open(file_path, 'r+', encoding='utf-8') as f:
             lines = f.readlines()
-        
-        if 1 <= line_number <= len(lines):
+
+            if not 1 <= line_number <= len(lines):
+                print(f"错误: 行号 {line_number} 无效。")
+                return False
+
             target_line = lines[line_number - 1].rstrip('\n')
             comment_text = f" // {comment}"
             new_line = target_line + comment_text + '\n'
             
             lines[line_number - 1] = new_line
             
+            # 写回必须在 with 块内完成, 否则文件已经关闭
             f.seek(0)
             f.writelines(lines)
             f.truncate()
             
             print(f"成功在 {file_path}:{line_number} 处插入注释: '{comment}'")
             return True
-        else:
-            print(f"错误: 行号 {line_number} 无效。")
-            return False
-            
+
     except Exception as e:
         print(f"插入注释时出错: {e}")
         return False
@@ -204,7 +259,8 @@ int main(){
         f.write(test_file_content)
 
     print("--- 1. 解析HTML报告并提取错误信息 ---")
-    error_info = parse_html_report(html_file_path)
+    with trace.span("stage.report"):
+        error_info = parse_html_report(html_file_path)
     if not error_info:
         return
         
@@ -212,7 +268,8 @@ int main(){
     print(error_info)
     
     print("\n--- 2. 使用Clang AST提取函数代码 ---")
-    function_code = extract_function_with_clang_ast(error_info['file_path'], error_info['line_number'])
+    with trace.span("stage.extract"):
+        function_code = extract_function_with_clang_ast(error_info['file_path'], error_info['line_number'])
     
     if function_code:
         print("\n成功提取的函数代码:")
@@ -222,7 +279,8 @@ int main(){
         
         # 在成功提取函数代码后，才在原始文件插入注释
         print(f"\n--- 3. 在原始文件中插入注释: {error_info['error_code']} ---")
-        insert_comment_into_file(error_info['file_path'], error_info['line_number'], error_info['error_code'])
+        with trace.span("stage.annotate"):
+            insert_comment_into_file(error_info['file_path'], error_info['line_number'], error_info['error_code'])
 
 
 if __name__ == "__main__":
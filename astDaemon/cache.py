@@ -0,0 +1,176 @@
+"""翻译单元 (TU) 缓存.
+
+不依赖 socket, AST 常驻服务 (server.py) 和监视模式 (watch/watcher.py) 共用.
+"""
+
+import os
+from collections import OrderedDict
+
+import clang.cindex
+
+from llmtest_perf import trace
+from findDiffFunc.findDiffFunc import getFuncExtentsInTU, getFuncHash
+
+# libclang 不提供 TU 的实际内存占用, 这里按 (源文件 + 头文件) 字节数乘以该系数估算
+# 估算值驱动淘汰, 进程常驻内存超限时再按比例收紧估算值的预算, 见 TUCache._evict
+AST_BYTES_PER_SOURCE_BYTE = 8
+# 常驻内存超限时, 预算收紧为当前估算总量的该比例
+BUDGET_SHRINK = 0.75
+# 常驻内存比上次收紧时又增长了 max_bytes 的该比例, 才再次收紧, 避免每次查询都淘汰
+RSS_SLACK = 1 / 16
+# 常驻内存回落到 max_bytes 的该比例以下时, 预算恢复为 max_bytes
+RSS_RECOVER = 0.75
+
+
+class TUEntry:
+    """
+    缓存中的一个翻译单元, 以及由它得到的函数范围和函数体hash
+    """
+
+    def __init__(self, file_path: str, args: tuple[str, ...], tu: clang.cindex.TranslationUnit):
+        self.file_path = file_path
+        self.args = args
+        self.tu = tu
+        self.refresh()
+
+    def refresh(self) -> None:
+        """
+        (重新) 解析后调用, 更新依赖文件的状态和函数表
+        """
+        # 先记录依赖文件的状态再读取, 读取期间文件被修改时下次查询仍会判定为过期
+        deps = [self.file_path] + [inc.include.name for inc in self.tu.get_includes()]
+        deps = {path: _statFile(path) for path in deps}
+
+        # 只需要按行号截取函数体, 无法按 UTF-8 解码的字节 (例如 GBK 注释) 直接替换
+        with open(self.file_path, "r", encoding="utf-8", errors="replace") as f:
+            lines = f.readlines()
+            trace.count("bytes_read", f.tell())
+        extents = getFuncExtentsInTU(self.tu, self.file_path)
+        hashes = {
+            name: getFuncHash("".join(lines[start_line - 1 : end_line]))
+            for name, start_line, end_line in extents
+        }
+
+        # 全部成功后再一起更新, 失败时不会留下 "依赖是新的, 函数表是旧的" 的条目
+        self.lines, self.extents, self.hashes = lines, extents, hashes
+        self.deps = deps
+        self.cost = sum(stat[1] for stat in deps.values() if stat) * AST_BYTES_PER_SOURCE_BYTE
+
+    def isStale(self) -> bool:
+        return any(_statFile(path) != stat for path, stat in self.deps.items())
+
+    def funcBody(self, start_line: int, end_line: int) -> str:
+        return "".join(self.lines[start_line - 1 : end_line])
+
+
+def _statFile(file_path: str) -> tuple[int, int] | None:
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class TUCache:
+    """
+    翻译单元的 LRU 缓存, 同时限制条目数量, 估算的内存占用和进程实际的常驻内存
+    最近一次访问的条目总会被保留, 即使它单独超过了内存上限
+
+    libclang 释放 TU 后内存通常留在分配器里, 常驻内存不一定下降, 因此不能 "超限就一直淘汰",
+    否则缓存会永久缩到一个条目. 常驻内存超限时只把估算值的预算 (budget) 收紧一次,
+    之后常驻内存继续增长才再次收紧; 回落后预算恢复
+    """
+
+    def __init__(self, max_tus: int = 64, max_bytes: int = 1024 * 1024 * 1024):
+        self.index = clang.cindex.Index.create()
+        self.max_tus = max_tus
+        self.max_bytes = max_bytes
+        self.budget = max_bytes
+        self._rss_mark = 0
+        self.entries: OrderedDict[tuple, TUEntry] = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "reparses": 0, "evictions": 0}
+
+    def get(self, file_path: str, args: list[str] = None) -> TUEntry:
+        file_path = os.path.abspath(file_path)
+        args = tuple(args or ())
+        key = (file_path, args)
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            if entry.isStale():
+                if not os.path.exists(file_path):
+                    del self.entries[key]
+                    raise FileNotFoundError(f"文件不存在: {file_path}")
+                try:
+                    with trace.span("libclang.reparse", file=file_path):
+                        entry.tu.reparse()
+                        entry.refresh()
+                except Exception:
+                    # 重新解析失败的条目不能留在缓存里, 否则下次查询会把旧结果当作命中返回
+                    del self.entries[key]
+                    raise
+                self.stats["reparses"] += 1
+                trace.count("tu_reparses")
+            else:
+                self.stats["hits"] += 1
+                trace.count("cache_hits")
+            self._evict()
+            return entry
+
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"文件不存在: {file_path}")
+        with trace.span("libclang.parse", file=file_path):
+            tu = self.index.parse(
+                file_path,
+                args=list(args),
+                options=clang.cindex.TranslationUnit.PARSE_PRECOMPILED_PREAMBLE,
+            )
+            entry = TUEntry(file_path, args, tu)
+        self.stats["misses"] += 1
+        trace.count("cache_misses")
+        trace.count("files_parsed")
+        self.entries[key] = entry
+        self._evict()
+        return entry
+
+    def totalBytes(self) -> int:
+        return sum(entry.cost for entry in self.entries.values())
+
+    def _evict(self) -> None:
+        rss = trace.current_rss()
+        if rss > self.max_bytes and rss > self._rss_mark:
+            self.budget = min(self.budget, int(self.totalBytes() * BUDGET_SHRINK))
+            self._rss_mark = rss + int(self.max_bytes * RSS_SLACK)
+            trace.count("tu_budget_shrinks")
+        elif rss < self.max_bytes * RSS_RECOVER and self.budget < self.max_bytes:
+            self.budget = self.max_bytes
+            self._rss_mark = 0
+
+        while len(self.entries) > 1 and (
+            len(self.entries) > self.max_tus or self.totalBytes() > self.budget
+        ):
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+            trace.count("tu_evictions")
+
+
+def funcAtLine(entry: TUEntry, line: int) -> dict | None:
+    """
+    返回包含 line 的最内层函数, 找不到时返回None
+    """
+    best = None
+    for name, start_line, end_line in entry.extents:
+        if start_line <= line <= end_line:
+            if best is None or end_line - start_line < best[2] - best[1]:
+                best = (name, start_line, end_line)
+    if best is None:
+        return None
+    name, start_line, end_line = best
+    return {
+        "func_name": name,
+        "start_line": start_line,
+        "end_line": end_line,
+        "func_body": entry.funcBody(start_line, end_line),
+        "func_hash": entry.hashes[name],
+    }
@@ -0,0 +1,108 @@
+"""AST 常驻服务的轻量客户端.
+
+不依赖 clang 和 bs4, 只负责通过 Unix socket 发送请求, 适合编辑器插件和 CI 钩子频繁调用.
+
+用法:
+    python astDaemon/client.py func-at-line CFile/main.c 13
+    python astDaemon/client.py func-table CFile/main.c
+    python astDaemon/client.py diff-funcs version1/main.c version2/main.c
+    python astDaemon/client.py stats
+    python astDaemon/client.py shutdown
+
+协议: 每个连接发送一行 JSON 请求, 服务端返回一行 JSON 响应后关闭连接
+    请求  {"cmd": "func_at_line", "file": "...", "line": 13}
+    响应  {"ok": true, "result": ...} 或 {"ok": false, "error": "..."}
+"""
+
+import argparse
+import getpass
+import json
+import os
+import socket
+import sys
+import tempfile
+from pathlib import Path
+
+DEFAULT_SOCKET = os.environ.get(
+    "LLMTEST_AST_SOCKET",
+    os.path.join(tempfile.gettempdir(), f"llmtest-ast-{getpass.getuser()}.sock"),
+)
+
+
+class DaemonError(Exception):
+    """服务端返回 ok=false 时抛出"""
+
+
+def sendRequest(
+    request: dict, socket_path: str | Path = DEFAULT_SOCKET, timeout: float = 60.0
+):
+    """
+    发送一个请求并返回响应中的 result, 服务端报错时抛出 DaemonError
+    连接失败时抛出 OSError (例如服务未启动)
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(str(socket_path))
+        sock.sendall(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise DaemonError("服务端未返回任何数据")
+    response = json.loads(line)
+    if not response.get("ok"):
+        raise DaemonError(response.get("error", "未知错误"))
+    return response.get("result")
+
+
+def _absPath(file_path: str) -> str:
+    # 服务端的工作目录可能与客户端不同, 统一转换为绝对路径
+    return os.path.abspath(file_path)
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="AST 常驻服务客户端")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="服务端 socket 路径")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("func-at-line", help="查找包含指定行的函数")
+    p.add_argument("file")
+    p.add_argument("line", type=int)
+
+    p = sub.add_parser("func-table", help="列出文件中所有函数及其hash")
+    p.add_argument("file")
+    p.add_argument("--with-body", action="store_true", help="同时返回函数体")
+
+    p = sub.add_parser("diff-funcs", help="比较两个文件中函数体不同的函数")
+    p.add_argument("file1")
+    p.add_argument("file2")
+
+    sub.add_parser("stats", help="查看缓存状态")
+    sub.add_parser("ping", help="检查服务是否存活")
+    sub.add_parser("shutdown", help="关闭服务")
+
+    args = parser.parse_args(argv)
+
+    if args.cmd == "func-at-line":
+        request = {"cmd": "func_at_line", "file": _absPath(args.file), "line": args.line}
+    elif args.cmd == "func-table":
+        request = {"cmd": "func_table", "file": _absPath(args.file), "with_body": args.with_body}
+    elif args.cmd == "diff-funcs":
+        request = {"cmd": "diff_funcs", "file1": _absPath(args.file1), "file2": _absPath(args.file2)}
+    else:
+        request = {"cmd": args.cmd}
+
+    try:
+        result = sendRequest(request, args.socket)
+    except OSError as e:
+        print(f"无法连接到服务 {args.socket}: {e}", file=sys.stderr)
+        return 2
+    except DaemonError as e:
+        print(f"服务端出错: {e}", file=sys.stderr)
+        return 1
+
+    print(json.dumps(result, ensure_ascii=False, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
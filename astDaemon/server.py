@@ -0,0 +1,178 @@
+"""AST 常驻服务.
+
+在 Unix socket 上常驻一个 clang.cindex.Index, 并用 LRU 缓存已解析的翻译单元 (TU).
+文件 (或其包含的头文件) 发生变化时用 TranslationUnit.reparse 增量重新解析,
+查询 "某行所在函数", "函数表", "函数差异" 时不必再付出 Python/libclang 启动和冷解析的开销.
+
+用法:
+    python astDaemon/server.py --max-tus 64 --max-mem-mb 1024
+
+客户端见 astDaemon/client.py, 翻译单元缓存见 astDaemon/cache.py.
+"""
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+from pathlib import Path
+
+import clang.cindex
+
+if __package__ in (None, ""):
+    # 以脚本方式运行 (python astDaemon/server.py) 时仓库根目录不在 sys.path 中
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llmtest_perf import trace
+from findDiffFunc.findDiffFunc import diffFuncHashes
+from astDaemon.cache import TUCache, TUEntry, funcAtLine
+from astDaemon.client import DEFAULT_SOCKET
+
+# 单个连接等待请求的最长时间 (秒), 防止不发数据的客户端阻塞服务
+REQUEST_TIMEOUT = 1.0
+
+
+def funcTable(entry: TUEntry, with_body: bool = False, contain_filename: bool = True) -> dict[str, dict]:
+    """
+    结果格式与 getFuncInfoInFile 相同, 额外带有函数的起止行号
+    """
+    file_name = (os.path.basename(entry.file_path) + "/") if contain_filename else ""
+    result = dict()
+    for name, start_line, end_line in entry.extents:
+        info = {"func_hash": entry.hashes[name], "start_line": start_line, "end_line": end_line}
+        if with_body:
+            info["func_body"] = entry.funcBody(start_line, end_line)
+        result[file_name + name] = info
+    return result
+
+
+def diffFuncs(entry1: TUEntry, entry2: TUEntry, need_hash: bool = True, contain_filename: bool = True) -> dict[str, list[str]]:
+    """
+    结果格式与 getDiffFuncName 相同
+    """
+    file_name = (os.path.basename(entry1.file_path) + "/") if contain_filename else ""
+    hashes1 = {file_name + name: h for name, h in entry1.hashes.items()}
+    hashes2 = {file_name + name: h for name, h in entry2.hashes.items()}
+    return diffFuncHashes(hashes1, hashes2, need_hash)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """
+    每个连接只处理一个请求, 并且读取请求有超时
+    服务是单线程的, 一直不关闭连接的客户端不能阻塞其他查询
+    """
+
+    timeout = REQUEST_TIMEOUT
+
+    def handle(self):
+        try:
+            raw = self.rfile.readline()
+        except socket.timeout:
+            return
+        if not raw.strip():
+            return
+        try:
+            request = json.loads(raw)
+            cmd = request.get("cmd")
+            with trace.span(f"daemon.{cmd}", cat="daemon"):
+                response = {"ok": True, "result": self.server.dispatch(request)}
+        except Exception as e:
+            response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        self.wfile.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+
+class ASTServer(socketserver.UnixStreamServer):
+    """
+    单线程处理请求: libclang 的 Index/TU 不保证线程安全, 而缓存命中时每个查询只需几毫秒
+    """
+
+    def __init__(self, socket_path: str | Path, cache: TUCache):
+        self.socket_path = str(socket_path)
+        self.cache = cache
+        _removeStaleSocket(self.socket_path)
+        super().__init__(self.socket_path, _Handler)
+
+    def dispatch(self, request: dict):
+        cmd = request.get("cmd")
+        args = request.get("args")
+        if cmd == "ping":
+            return "pong"
+        if cmd == "func_at_line":
+            return funcAtLine(self.cache.get(request["file"], args), int(request["line"]))
+        if cmd == "func_table":
+            return funcTable(
+                self.cache.get(request["file"], args),
+                with_body=request.get("with_body", False),
+                contain_filename=request.get("contain_filename", True),
+            )
+        if cmd == "diff_funcs":
+            entry1 = self.cache.get(request["file1"], args)
+            entry2 = self.cache.get(request["file2"], args)
+            return diffFuncs(
+                entry1,
+                entry2,
+                need_hash=request.get("need_hash", True),
+                contain_filename=request.get("contain_filename", True),
+            )
+        if cmd == "stats":
+            return {
+                **self.cache.stats,
+                "tus": len(self.cache.entries),
+                "estimated_bytes": self.cache.totalBytes(),
+                "rss_bytes": trace.current_rss(),
+                "max_bytes": self.cache.max_bytes,
+                "budget_bytes": self.cache.budget,
+                "files": [key[0] for key in self.cache.entries],
+            }
+        if cmd == "shutdown":
+            # serve_forever 所在线程不能直接调用 shutdown, 否则会死锁
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return "bye"
+        raise ValueError(f"未知命令: {cmd}")
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def _removeStaleSocket(socket_path: str) -> None:
+    """
+    删除上次异常退出残留的 socket 文件, 如果已有服务在监听则报错
+    """
+    if not os.path.exists(socket_path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            os.unlink(socket_path)
+            return
+    raise RuntimeError(f"服务已在运行: {socket_path}")
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="常驻 libclang 索引和翻译单元缓存的 AST 服务")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="监听的 socket 路径")
+    parser.add_argument("--max-tus", type=int, default=64, help="最多缓存的翻译单元数量")
+    parser.add_argument("--max-mem-mb", type=int, default=1024, help="内存上限 (MB), 进程常驻内存或缓存估算值超过时淘汰翻译单元")
+    parser.add_argument("--libclang", default=None, help="libclang 动态库路径")
+    args = parser.parse_args(argv)
+
+    if args.libclang:
+        clang.cindex.Config.set_library_file(args.libclang)
+
+    cache = TUCache(max_tus=args.max_tus, max_bytes=args.max_mem_mb * 1024 * 1024)
+    with ASTServer(args.socket, cache) as server:
+        print(f"AST 服务已启动: {args.socket}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
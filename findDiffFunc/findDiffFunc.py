@@ -1,9 +1,15 @@
 import clang.cindex
 import os
+import sys
 from pathlib import Path
 import hashlib
 import json
 
+if __package__ in (None, ""):
+    # 以脚本方式运行 (python findDiffFunc/findDiffFunc.py) 时仓库根目录不在 sys.path 中
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llmtest_perf import trace
+
 
 # 确保 clang.cindex 可以找到 libclang 库
 # 如果你在 Windows 上，可能需要手动设置这个路径
@@ -18,7 +24,8 @@ def _getCodeByLine(
     current_line_number = 1
 
     with open(file_path, "r", encoding="utf-8") as f:
-        for line in f:
+        # 用 readline 而不是迭代文件, 这样结束时可以用 tell() 得到实际读取的字节数
+        for line in iter(f.readline, ""):
             if current_line_number >= start_line:
                 result_lines.append(line)
 
@@ -27,11 +34,43 @@ def _getCodeByLine(
                 break
 
             current_line_number += 1
+        trace.count("bytes_read", f.tell())
 
     return "".join(result_lines)
 
 
+def getFuncHash(function_body: str) -> str:
+    """
+    计算函数体的hash值, 用于判断函数是否发生变化
+    """
+    return hashlib.sha1(function_body.encode("utf-8")).hexdigest()
+
+
+def getFuncExtentsInTU(
+    tu: clang.cindex.TranslationUnit, prep_file: str, only_definition: bool = False
+) -> list[tuple[str, int, int]]:
+    """
+    遍历已解析的翻译单元, 返回 prep_file 中所有函数的 (函数名, 起始行, 结束行)
+    prep_file 需要与解析时传入的路径一致, 头文件中的函数会被忽略
+    only_definition 是否只保留函数定义 (跳过只有声明的原型)
+    """
+    extents = []
+    # 遍历 AST 中的所有节点
+    for node in tu.cursor.walk_preorder():
+        # 查找 'FUNCTION_DECL' 类型的节点，它代表一个函数声明或定义
+        if node.kind == clang.cindex.CursorKind.FUNCTION_DECL:
+            # 检查这个节点是否在当前文件内（而非头文件）
+            if node.location.file and node.location.file.name == prep_file:
+                if only_definition and not node.is_definition():
+                    continue
+                extents.append(
+                    (node.spelling, node.extent.start.line, node.extent.end.line)
+                )
+    return extents
+
+
 # 已测试
+@trace.traced("getFuncInfoInFile")
 def getFuncInfoInFile(
     prep_file: str, only_hash: bool = False, contain_filename: bool = True
 ) -> dict[str, dict]:
@@ -53,34 +92,27 @@ def getFuncInfoInFile(
         index = clang.cindex.Index.create()
         # 解析文件并生成 AST。
         # 'translation_unit' 是 AST 的根节点。
-        tu = index.parse(prep_file)
+        with trace.span("libclang.parse", file=prep_file):
+            tu = index.parse(prep_file)
+        trace.count("files_parsed")
 
         result = dict()
-        # 遍历 AST 中的所有节点
-        for node in tu.cursor.walk_preorder():
-            # 查找 'FUNCTION_DECL' 类型的节点，它代表一个函数声明或定义
-            if node.kind == clang.cindex.CursorKind.FUNCTION_DECL:
-                # 检查这个节点是否在当前文件内（而非头文件）
-                if node.location.file and node.location.file.name == prep_file:
-                    function_name = file_name + node.spelling
-                    start_line = node.extent.start.line
-                    end_line = node.extent.end.line
-                    function_body = _getCodeByLine(prep_file, start_line, end_line)
-                    function_hash = hashlib.sha1(
-                        function_body.encode("utf-8")
-                    ).hexdigest()
-
-                    if not only_hash:
-                        result.update(
-                            {
-                                function_name: {
-                                    "func_body": function_body,
-                                    "func_hash": function_hash,
-                                }
-                            }
-                        )
-                    else:
-                        result.update({function_name: {"func_hash": function_hash}})
+        for func_name, start_line, end_line in getFuncExtentsInTU(tu, prep_file):
+            function_name = file_name + func_name
+            function_body = _getCodeByLine(prep_file, start_line, end_line)
+            function_hash = getFuncHash(function_body)
+
+            if not only_hash:
+                result.update(
+                    {
+                        function_name: {
+                            "func_body": function_body,
+                            "func_hash": function_hash,
+                        }
+                    }
+                )
+            else:
+                result.update({function_name: {"func_hash": function_hash}})
         return result
 
     except clang.cindex.LibclangError as e:
@@ -91,7 +123,23 @@ def getFuncInfoInFile(
         return []
 
 
+def diffFuncHashes(
+    hashes1: dict[str, str], hashes2: dict[str, str], need_hash: bool = True
+) -> dict[str, list[str]]:
+    """
+    比较两组 函数名 : 函数体hash, 返回两边都存在但hash不同的函数
+    结果格式与 getDiffFuncName 相同
+    """
+    result = dict()
+    for function_name, hash2 in hashes2.items():
+        hash1 = hashes1.get(function_name)
+        if hash1 is not None and hash1 != hash2:
+            result[function_name] = [hash1, hash2] if need_hash else [""]
+    return result
+
+
 # 已测试
+@trace.traced("getDiffFuncName")
 def getDiffFuncName(
     file_path1: str | Path,
     file_path2: str | Path,
@@ -108,28 +156,19 @@ def getDiffFuncName(
     file_name = (os.path.basename(str(file_path1)) + "/") if contain_filename else ""
     try:
         index = clang.cindex.Index.create()
-        tu = index.parse(file_path2)
-
-        for node in tu.cursor.walk_preorder():
-            if node.kind == clang.cindex.CursorKind.FUNCTION_DECL:
-                if node.location.file and node.location.file.name == file_path2:
-                    function_name = file_name + node.spelling
-
-                    if function_name in dict1:
-                        hash1 = dict1[function_name]["func_hash"]
-
-                        start_line = node.extent.start.line
-                        end_line = node.extent.end.line
-                        hash2 = hashlib.sha1(
-                            _getCodeByLine(file_path2, start_line, end_line).encode(
-                                "utf-8"
-                            )
-                        ).hexdigest()
-                        if hash1 != hash2:
-                            if not need_hash:
-                                result.update({function_name: [""]})
-                            else:
-                                result.update({function_name: [hash1, hash2]})
+        with trace.span("libclang.parse", file=file_path2):
+            tu = index.parse(file_path2)
+        trace.count("files_parsed")
+
+        hashes1 = {name: info["func_hash"] for name, info in (dict1 or {}).items()}
+        hashes2 = dict()
+        for func_name, start_line, end_line in getFuncExtentsInTU(tu, file_path2):
+            function_name = file_name + func_name
+            if function_name in hashes1:
+                hashes2[function_name] = getFuncHash(
+                    _getCodeByLine(file_path2, start_line, end_line)
+                )
+        result.update(diffFuncHashes(hashes1, hashes2, need_hash))
         return result
 
     except clang.cindex.LibclangError as e:
@@ -144,7 +183,7 @@ def getDiffFuncName(
 def dictToJson(mydict: dict[str, list[str]], json_file: str | Path) -> None:
     # TODO 这里增加一个, 当文件夹不存在时, 自动创建文件夹
 
-    with open(json_file, "w") as f:
+    with trace.span("json.dump", file=json_file), open(json_file, "w") as f:
         # TODO这里存在问题, 该格式的字典不能直接用json.dump写入json文件, 会报错
         json.dump(mydict, f, ensure_ascii=False, indent=4)
 
@@ -153,7 +192,7 @@ def dictToJson(mydict: dict[str, list[str]], json_file: str | Path) -> None:
 def updateDiffFuncCollection(
     json_file: str | Path, mydict: dict[str, list[str]]
 ) -> None:
-    with open(json_file, "r") as f:
+    with trace.span("json.load", file=json_file), open(json_file, "r") as f:
         data = json.load(f)
 
     for func_name, hash_list in mydict.items():
@@ -0,0 +1,353 @@
+"""用 LLM 作为评审 (LLM-as-a-Judge) 批量评估修复候选.
+
+把多个候选打包进同一个评审提示词, 在并发上限内异步请求 OpenAI 兼容的 chat completions 接口,
+评审结果按 (原始函数hash, 候选hash, 评分标准版本) 缓存, 相同的候选不会被重复评审.
+最后输出准确率和吞吐量报告, 用于调整批大小/并发数, 降低每个被接受修复的成本.
+
+候选 (JSON Lines, 每行一个):
+    {"id": "c1", "original": "原始函数代码", "candidate": "修复后的函数代码",
+     "error_codes": ["D12"], "label": true, "validation": "pass"}
+    label (人工标注是否应当接受) 和 validation (validate/validator.py 的结果状态) 可选.
+
+用法:
+    python judge/mock_server.py --port 8765 &
+    python judge/judge.py candidates.jsonl --endpoint http://127.0.0.1:8765/v1/chat/completions \\
+        --batch-size 8 --concurrency 4 --out verdicts.jsonl
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+if __package__ in (None, ""):
+    # 以脚本方式运行 (python judge/judge.py) 时仓库根目录不在 sys.path 中
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llmtest_perf import trace
+
+# 修改评分标准后需要提升版本号, 旧的缓存结果随之失效
+RUBRIC_VERSION = "v1"
+RUBRIC = """评分标准:
+1. 修复后的函数是否消除了所列静态分析错误代号对应的问题;
+2. 是否保持原函数的功能和接口不变 (函数名, 参数, 返回值, 副作用);
+3. 是否引入了新的缺陷 (未定义行为, 越界, 资源泄漏等);
+4. 修改是否最小, 没有无关的重写.
+满足全部 4 条时 verdict 为 "accept", 否则为 "reject". score 为 0-10 的整数."""
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "llmtest", "judge_cache.jsonl")
+
+
+def _sha1(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def cacheKey(item: dict, rubric_version: str = RUBRIC_VERSION) -> str:
+    return f"{_sha1(item['original'])}:{_sha1(item['candidate'])}:{rubric_version}"
+
+
+class VerdictCache:
+    """
+    评审结果缓存, 以追加方式写入 JSON Lines 文件, 启动时全部读入内存
+    """
+
+    def __init__(self, cache_file: str | Path = DEFAULT_CACHE_FILE):
+        self.cache_file = str(cache_file)
+        self.data: dict[str, dict] = {}
+        if os.path.exists(self.cache_file):
+            with trace.span("json.load", file=self.cache_file), open(self.cache_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.data[record["key"]] = record["verdict"]
+
+    def get(self, key: str) -> dict | None:
+        return self.data.get(key)
+
+    def put(self, key: str, verdict: dict) -> None:
+        self.data[key] = verdict
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_file)), exist_ok=True)
+        with open(self.cache_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"key": key, "verdict": verdict}, ensure_ascii=False) + "\n")
+
+
+def buildBatchPrompt(items: list[dict]) -> str:
+    """
+    把多个候选打包成一个评审提示词, 要求模型以 JSON 数组返回每个候选的结论
+    """
+    parts = [
+        "你是 C 代码评审专家. 下面有若干个针对静态分析告警的修复候选, 请逐个评审.",
+        RUBRIC,
+        '只输出一个 JSON 数组, 每个元素形如 {"id": "候选id", "verdict": "accept" 或 "reject", '
+        '"score": 整数, "reason": "一句话理由"}, 不要输出其他内容.',
+    ]
+    for item in items:
+        parts.append(
+            f"### 候选 {item['id']}\n"
+            f"错误代号: {', '.join(item.get('error_codes', [])) or '无'}\n"
+            f"原始函数:\n```c\n{item['original']}\n```\n"
+            f"修复后的函数:\n```c\n{item['candidate']}\n```"
+        )
+    return "\n\n".join(parts)
+
+
+def parseVerdicts(text: str) -> dict[str, dict]:
+    """
+    从模型输出中解析出 id -> 结论, 无法解析时返回空字典
+    """
+    start, end = text.find("["), text.rfind("]")
+    if start < 0 or end < start:
+        return {}
+    try:
+        records = json.loads(text[start : end + 1])
+    except json.JSONDecodeError:
+        return {}
+    verdicts = {}
+    for record in records:
+        if not isinstance(record, dict) or "id" not in record:
+            continue
+        verdict = str(record.get("verdict", "")).lower()
+        if verdict not in ("accept", "reject"):
+            continue
+        verdicts[str(record["id"])] = {
+            "verdict": verdict,
+            "score": record.get("score"),
+            "reason": record.get("reason", ""),
+        }
+    return verdicts
+
+
+def makeBatches(items: list[dict], batch_size: int, max_chars: int) -> list[list[dict]]:
+    """
+    按数量和代码总长度贪心地分批, 避免单个提示词过长
+    """
+    batches, current, current_chars = [], [], 0
+    for item in items:
+        size = len(item["original"]) + len(item["candidate"])
+        if current and (len(current) >= batch_size or current_chars + size > max_chars):
+            batches.append(current)
+            current, current_chars = [], 0
+        current.append(item)
+        current_chars += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _postJson(url: str, payload: dict, api_key: str | None, timeout: float) -> dict:
+    headers = {"Content-Type": "application/json"}
+    if api_key:
+        headers["Authorization"] = f"Bearer {api_key}"
+    request = urllib.request.Request(
+        url, data=json.dumps(payload, ensure_ascii=False).encode("utf-8"), headers=headers
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+class Judge:
+    """
+    异步批量评审, 并发请求数由 concurrency 限制
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        model: str = "judge",
+        batch_size: int = 8,
+        concurrency: int = 4,
+        max_batch_chars: int = 24000,
+        timeout: float = 120.0,
+        api_key: str = None,
+        cache: VerdictCache = None,
+    ):
+        self.endpoint = endpoint
+        self.model = model
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_batch_chars = max_batch_chars
+        self.timeout = timeout
+        self.api_key = api_key
+        self.cache = cache
+        self.stats = {
+            "requests": 0,
+            "failed_requests": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cache_hits": 0,
+            "unparsed": 0,
+        }
+
+    async def _judgeBatch(
+        self, batch: list[dict], semaphore: asyncio.Semaphore, executor: ThreadPoolExecutor
+    ) -> dict[str, dict]:
+        """
+        评审一批候选, 返回 缓存 key -> 结论
+        提示词中的 id 只是批内序号 1..N, 模型容易原样抄回, 也比缓存 key 省 token
+        """
+        numbered = [{**item, "id": str(i)} for i, item in enumerate(batch, 1)]
+        payload = {
+            "model": self.model,
+            "temperature": 0,
+            "messages": [{"role": "user", "content": buildBatchPrompt(numbered)}],
+        }
+        async with semaphore:
+            with trace.span("judge.request", cat="judge", batch=len(batch)):
+                try:
+                    response = await asyncio.get_running_loop().run_in_executor(
+                        executor, _postJson, self.endpoint, payload, self.api_key, self.timeout
+                    )
+                except Exception as e:
+                    print(f"评审请求失败: {e}", file=sys.stderr)
+                    self.stats["failed_requests"] += 1
+                    return {}
+        self.stats["requests"] += 1
+        usage = response.get("usage", {})
+        self.stats["prompt_tokens"] += usage.get("prompt_tokens", 0)
+        self.stats["completion_tokens"] += usage.get("completion_tokens", 0)
+        try:
+            text = response["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            return {}
+        verdicts = parseVerdicts(text)
+        return {item["key"]: verdicts[item["id"]] for item in numbered if item["id"] in verdicts}
+
+    async def judgeAll(self, items: list[dict]) -> list[dict]:
+        """
+        评审所有候选, 返回与输入顺序一致的结果记录
+        """
+        keys = [cacheKey(item) for item in items]
+        verdicts: dict[str, dict] = {}
+        pending: dict[str, dict] = {}
+        for item, key in zip(items, keys):
+            cached = self.cache.get(key) if self.cache else None
+            if cached is not None:
+                verdicts[key] = cached
+                self.stats["cache_hits"] += 1
+                trace.count("cache_hits")
+            elif key not in pending:
+                # 同一次运行中内容相同的候选只评审一次
+                pending[key] = item
+
+        to_judge = [{**item, "key": key} for key, item in pending.items()]
+        semaphore = asyncio.Semaphore(self.concurrency)
+        batches = makeBatches(to_judge, self.batch_size, self.max_batch_chars)
+        # 请求是阻塞的 urllib 调用, 默认线程池最多 min(32, cpu+4) 个线程, 会悄悄限制并发数,
+        # 因此使用与 concurrency 一样大的专用线程池
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            results = await asyncio.gather(
+                *(self._judgeBatch(batch, semaphore, executor) for batch in batches)
+            )
+
+        for batch, batch_verdicts in zip(batches, results):
+            for item in batch:
+                verdict = batch_verdicts.get(item["key"])
+                if verdict is None:
+                    self.stats["unparsed"] += 1
+                    continue
+                verdicts[item["key"]] = verdict
+                if self.cache:
+                    self.cache.put(item["key"], verdict)
+
+        records = []
+        for item, key in zip(items, keys):
+            verdict = verdicts.get(key, {"verdict": "error", "score": None, "reason": "未得到评审结果"})
+            record = {"id": item.get("id"), **verdict}
+            if "label" in item:
+                record["label"] = item["label"]
+            records.append(record)
+        return records
+
+
+def buildReport(
+    records: list[dict],
+    stats: dict,
+    elapsed: float,
+    price_in: float = 0.0,
+    price_out: float = 0.0,
+) -> dict:
+    """
+    汇总准确率 (有 label 时), 吞吐量和成本
+    price_in / price_out 为每 1000 个输入 / 输出 token 的价格
+    """
+    accepted = sum(1 for r in records if r["verdict"] == "accept")
+    cost = stats["prompt_tokens"] / 1000 * price_in + stats["completion_tokens"] / 1000 * price_out
+    report = {
+        "rubric_version": RUBRIC_VERSION,
+        "candidates": len(records),
+        "accepted": accepted,
+        "rejected": sum(1 for r in records if r["verdict"] == "reject"),
+        "errors": sum(1 for r in records if r["verdict"] == "error"),
+        **stats,
+        "elapsed_s": round(elapsed, 3),
+        "candidates_per_s": round(len(records) / elapsed, 2) if elapsed > 0 else None,
+        "cost": round(cost, 6),
+        "cost_per_accepted": round(cost / accepted, 6) if accepted else None,
+    }
+
+    labeled = [r for r in records if "label" in r and r["verdict"] != "error"]
+    if labeled:
+        tp = sum(1 for r in labeled if r["verdict"] == "accept" and r["label"])
+        fp = sum(1 for r in labeled if r["verdict"] == "accept" and not r["label"])
+        fn = sum(1 for r in labeled if r["verdict"] == "reject" and r["label"])
+        tn = len(labeled) - tp - fp - fn
+        report["accuracy"] = round((tp + tn) / len(labeled), 4)
+        report["precision"] = round(tp / (tp + fp), 4) if tp + fp else None
+        report["recall"] = round(tp / (tp + fn), 4) if tp + fn else None
+    return report
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="批量 LLM-as-a-Judge 评审修复候选")
+    parser.add_argument("candidates", help="候选 JSON Lines 文件")
+    parser.add_argument("--endpoint", default="http://127.0.0.1:8765/v1/chat/completions")
+    parser.add_argument("--model", default="judge")
+    parser.add_argument("--batch-size", type=int, default=8, help="每个提示词中的候选数")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时进行的请求数")
+    parser.add_argument("--max-batch-chars", type=int, default=24000, help="每个提示词中代码的最大总长度")
+    parser.add_argument("--timeout", type=float, default=120.0, help="单个请求的超时 (秒)")
+    parser.add_argument("--cache-file", default=DEFAULT_CACHE_FILE, help="评审结果缓存文件")
+    parser.add_argument("--no-cache", action="store_true", help="不读写缓存")
+    parser.add_argument("--only-passed", action="store_true", help="只评审 validation 为 pass 的候选")
+    parser.add_argument("--price-in", type=float, default=0.0, help="每 1000 个输入 token 的价格")
+    parser.add_argument("--price-out", type=float, default=0.0, help="每 1000 个输出 token 的价格")
+    parser.add_argument("--out", default=None, help="逐条结果的输出文件 (JSON Lines)")
+    args = parser.parse_args(argv)
+
+    with open(args.candidates, "r", encoding="utf-8") as f:
+        items = [json.loads(line) for line in f if line.strip()]
+    if args.only_passed:
+        # 没有 validation 字段的候选未经过编译和单元测试, 不算通过
+        items = [item for item in items if item.get("validation") == "pass"]
+
+    judge = Judge(
+        args.endpoint,
+        model=args.model,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        max_batch_chars=args.max_batch_chars,
+        timeout=args.timeout,
+        api_key=os.environ.get("LLMTEST_JUDGE_API_KEY"),
+        cache=None if args.no_cache else VerdictCache(args.cache_file),
+    )
+    start = time.perf_counter()
+    records = asyncio.run(judge.judgeAll(items))
+    elapsed = time.perf_counter() - start
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    report = buildReport(records, judge.stats, elapsed, args.price_in, args.price_out)
+    print(json.dumps(report, ensure_ascii=False, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""本地模拟的 OpenAI 兼容评审接口, 用于在不调用真实模型的情况下调试 judge.py 的批大小和并发数.
+
+规则很简单: 修复后的函数与原函数 (忽略空白) 相同, 或者包含 TODO 时判为 reject, 否则 accept.
+每个请求的延迟 = --latency + 每个候选 --per-item-latency, token 数按 4 个字符 1 个 token 估算.
+
+用法:
+    python judge/mock_server.py --port 8765 --latency 0.5
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_CANDIDATE_RE = re.compile(
+    r"### 候选 (\S+)\n.*?原始函数:\n```c\n(.*?)\n```\n修复后的函数:\n```c\n(.*?)\n```",
+    re.DOTALL,
+)
+
+
+def mockVerdicts(prompt: str) -> list[dict]:
+    verdicts = []
+    for candidate_id, original, candidate in _CANDIDATE_RE.findall(prompt):
+        unchanged = "".join(original.split()) == "".join(candidate.split())
+        if unchanged:
+            verdicts.append({"id": candidate_id, "verdict": "reject", "score": 0, "reason": "未做任何修改"})
+        elif "TODO" in candidate:
+            verdicts.append({"id": candidate_id, "verdict": "reject", "score": 3, "reason": "修复不完整"})
+        else:
+            verdicts.append({"id": candidate_id, "verdict": "accept", "score": 8, "reason": "修复合理"})
+    return verdicts
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length))
+        prompt = "".join(m.get("content", "") for m in request.get("messages", []))
+        verdicts = mockVerdicts(prompt)
+        time.sleep(self.server.latency + self.server.per_item_latency * len(verdicts))
+
+        content = json.dumps(verdicts, ensure_ascii=False)
+        body = json.dumps(
+            {
+                "object": "chat.completion",
+                "model": request.get("model", "mock"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {
+                    "prompt_tokens": len(prompt) // 4,
+                    "completion_tokens": len(content) // 4,
+                    "total_tokens": (len(prompt) + len(content)) // 4,
+                },
+            },
+            ensure_ascii=False,
+        ).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="模拟的 LLM 评审接口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="每个请求的固定延迟 (秒)")
+    parser.add_argument("--per-item-latency", type=float, default=0.05, help="每个候选增加的延迟 (秒)")
+    args = parser.parse_args(argv)
+
+    server = ThreadingHTTPServer((args.host, args.port), _Handler)
+    server.latency = args.latency
+    server.per_item_latency = args.per_item_latency
+    print(f"模拟评审接口已启动: http://{args.host}:{args.port}/v1/chat/completions")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
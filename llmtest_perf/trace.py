@@ -0,0 +1,273 @@
+"""轻量级的分阶段计时与计数工具。
+
+用法:
+    from llmtest_perf import trace
+
+    trace.enable()                     # 或设置环境变量 LLMTEST_TRACE=1
+    with trace.span("clang.parse", file=path):
+        ...
+    trace.count("files_parsed")
+    trace.export_chrome_trace("trace.json")
+    print(trace.summary())
+
+未启用时 span() 直接返回一个共享的空上下文, count() 只做一次布尔判断, 开销可以忽略.
+导出的 JSON 为 Chrome trace 格式, 可以在 chrome://tracing 或 https://ui.perfetto.dev 中打开.
+
+环境变量:
+- LLMTEST_TRACE=1          启用追踪, 进程退出时打印汇总表
+- LLMTEST_TRACE_FILE=路径   进程退出时同时导出 trace
+"""
+
+import atexit
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows 上没有 resource 模块
+    resource = None
+
+_enabled = os.environ.get("LLMTEST_TRACE", "") not in ("", "0")
+_lock = threading.Lock()
+_events: list[dict] = []
+_counters: dict[str, int] = {}
+_peak_rss = 0
+_t0 = time.perf_counter()
+_NULL_SPAN = contextlib.nullcontext()
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    """
+    清空已记录的所有事件和计数器.
+    """
+    global _peak_rss, _t0
+    with _lock:
+        _events.clear()
+        _counters.clear()
+        _peak_rss = 0
+        _t0 = time.perf_counter()
+
+
+def _now_us() -> float:
+    return (time.perf_counter() - _t0) * 1e6
+
+
+def _read_rss() -> int:
+    """
+    返回当前进程的峰值常驻内存 (字节), 无法获取时返回 0.
+    """
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 上单位为 KB, macOS 上为字节
+        return rss if sys.platform == "darwin" else rss * 1024
+    try:
+        import psutil
+
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss)
+    except Exception:
+        return 0
+
+
+def current_rss() -> int:
+    """
+    返回当前进程的常驻内存 (字节), 无法获取时返回 0.
+    与峰值不同, 释放内存后该值会下降, 适合用来判断是否需要淘汰缓存.
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return 0
+
+
+def sample_rss() -> int:
+    """
+    采样一次峰值内存, 并以 counter 事件记录到 trace 中.
+    """
+    global _peak_rss
+    if not _enabled:
+        return 0
+    rss = _read_rss()
+    with _lock:
+        if rss > _peak_rss:
+            _peak_rss = rss
+        _events.append(
+            {
+                "name": "peak_rss",
+                "ph": "C",
+                "ts": _now_us(),
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": {"bytes": rss},
+            }
+        )
+    return rss
+
+
+class _Span:
+    __slots__ = ("name", "cat", "args", "start")
+
+    def __init__(self, name: str, cat: str, args: dict):
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = _now_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = _now_us()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        event = {
+            "name": self.name,
+            "cat": self.cat,
+            "ph": "X",
+            "ts": self.start,
+            "dur": end - self.start,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": {k: str(v) for k, v in self.args.items()},
+        }
+        with _lock:
+            _events.append(event)
+        sample_rss()
+        return False
+
+
+def span(name: str, cat: str = "stage", **args):
+    """
+    计时上下文管理器. 关键字参数会作为事件的 args 写入 trace (例如 file=路径).
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, cat, args)
+
+
+def traced(name: str = None, cat: str = "stage"):
+    """
+    装饰器版本的 span, 默认以函数的限定名作为 span 名称.
+    """
+
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(span_name, cat, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name: str, n: int = 1) -> None:
+    """
+    累加计数器, 例如 files_parsed, cache_hits, bytes_read.
+    """
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def counters() -> dict[str, int]:
+    with _lock:
+        return dict(_counters)
+
+
+def export_chrome_trace(trace_file: str | Path) -> None:
+    """
+    以 Chrome trace 格式 (JSON Object Format) 导出已记录的事件.
+    """
+    sample_rss()
+    with _lock:
+        events = list(_events)
+        data = {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"counters": dict(_counters), "peak_rss": _peak_rss},
+        }
+    trace_file = Path(trace_file)
+    trace_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(trace_file, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def summary() -> str:
+    """
+    返回按 span 名称汇总的耗时表格, 以及计数器和峰值内存.
+    """
+    with _lock:
+        spans = [e for e in _events if e["ph"] == "X"]
+        counter_items = sorted(_counters.items())
+        peak = _peak_rss
+
+    stats: dict[str, list[float]] = {}
+    for e in spans:
+        stats.setdefault(e["name"], []).append(e["dur"] / 1000.0)
+
+    name_width = max([len("stage")] + [len(k) for k in stats] + [len(k) for k, _ in counter_items])
+    lines = [
+        f"{'stage':<{name_width}}  {'calls':>6}  {'total(ms)':>10}  {'mean(ms)':>10}  {'max(ms)':>10}"
+    ]
+    for name, durs in sorted(stats.items(), key=lambda kv: -sum(kv[1])):
+        total = sum(durs)
+        lines.append(
+            f"{name:<{name_width}}  {len(durs):>6}  {total:>10.2f}  {total / len(durs):>10.2f}  {max(durs):>10.2f}"
+        )
+    if counter_items:
+        lines.append("")
+        for name, value in counter_items:
+            lines.append(f"{name:<{name_width}}  {value:>6}")
+    lines.append("")
+    lines.append(f"peak_rss: {peak / (1024 * 1024):.1f} MiB")
+    return "\n".join(lines)
+
+
+def _finish() -> None:
+    if not _enabled:
+        return
+    trace_file = os.environ.get("LLMTEST_TRACE_FILE")
+    if trace_file:
+        export_chrome_trace(trace_file)
+    else:
+        sample_rss()
+    print(summary(), file=sys.stderr)
+    if trace_file:
+        print(f"trace 已导出到 {trace_file}", file=sys.stderr)
+
+
+atexit.register(_finish)
@@ -6,10 +6,18 @@
 """
 
 import difflib
+import sys
+from pathlib import Path
 from typing import List
 import git
 
+if __package__ in (None, ""):
+    # 以脚本方式运行 (python preprocess/a.py) 时仓库根目录不在 sys.path 中
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llmtest_perf import trace
 
+
+@trace.traced("git.changed_lines_between_commits", cat="git")
 def changed_lines_between_commits(repo_path: str, file_path: str, old_commit: str, new_commit: str) -> List[int]:
     """
     返回指定文件在 old_commit -> new_commit 之间在 new_commit 中被新增或修改的行号（基于 new_commit 的行号，1-based）。
@@ -58,6 +66,7 @@ def changed_lines_between_commits(repo_path: str, file_path: str, old_commit: st
 
     return sorted(changed)
 
+@trace.traced("git.get_changed_lines", cat="git")
 def get_changed_lines(repo_path, file_path, commit_hash1, commit_hash2):
     # 打开指定的 Git 仓库
     repo = git.Repo(repo_path)
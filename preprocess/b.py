@@ -2,7 +2,15 @@ from typing import List, Tuple
 from git import Repo, Diff
 import os
 import re
+import sys
+from pathlib import Path
 
+if __package__ in (None, ""):
+    # 以脚本方式运行 (python preprocess/b.py) 时仓库根目录不在 sys.path 中
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llmtest_perf import trace
+
+@trace.traced("git.changed_line_numbers", cat="git")
 def changed_line_numbers(repo_path: str, file_path: str, commit_a: str, commit_b: str) -> List[int]:
     """
     返回文件在 commit_a 和 commit_b 之间变更的行号列表（基于 commit_b 的行号）。
@@ -1,7 +1,15 @@
 # 最好的版本
+import sys
+from pathlib import Path
 import git
 from git import Repo
 
+if __package__ in (None, ""):
+    # 以脚本方式运行 (python preprocess/c.py) 时仓库根目录不在 sys.path 中
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llmtest_perf import trace
+
+@trace.traced("git.get_file_changed_lines", cat="git")
 def get_file_changed_lines(repo_path: str, file_path: str, commit1_hash: str, commit2_hash: str) -> list[int]:
     """
     Returns a list of line numbers that have been changed for a specific file
@@ -0,0 +1,425 @@
+"""修复候选的自动单元测试 (ppt.md 第 3 步: 自动编译 + 自动单元测试).
+
+每个候选只重新编译包含被修改函数的那个翻译单元, 工程中其余源文件和测试文件的目标文件
+按 (编译器, 编译选项, 源文件内容, 头文件内容) 的hash缓存, 与 ccache 的 direct mode 类似.
+每个候选在独立的临时目录中链接并运行测试, 通过线程池并行执行, 每个候选有单独的超时,
+超时后结束整个进程树 (POSIX 上杀进程组, Windows 上用 taskkill /T).
+
+工程配置 (JSON):
+    {
+        "root": "工程根目录, 相对于配置文件",
+        "sources": ["src/foo.c", "src/bar.c"],      被测代码, 不含 main
+        "test_sources": ["test/test_main.c"],       单元测试, 含 main, 返回 0 表示通过
+        "cflags": ["-Iinclude", "-O0"],
+        "ldflags": ["-lm"],
+        "test_args": [],
+        "timeout": 10
+    }
+
+候选 (JSON Lines, 每行一个):
+    {"id": "c1", "file": "src/foo.c", "func_name": "foo", "func_body": "int foo(void) {...}"}
+    可选 start_line/end_line, 省略时用 libclang 定位函数.
+
+用法:
+    python validate/validator.py project.json candidates.jsonl --jobs 8 > results.jsonl
+
+结果 (每行一个, 按完成顺序输出):
+    {"id": "c1", "status": "pass" | "fail" | "timeout" | "compile_error" | "link_error" | "error",
+     "returncode": 0, "duration": 0.12, "output": "..."}
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shlex
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+if __package__ in (None, ""):
+    # 以脚本方式运行 (python validate/validator.py) 时仓库根目录不在 sys.path 中
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llmtest_perf import trace
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "llmtest", "objects")
+# 结果中保留的输出长度
+OUTPUT_TAIL = 4000
+
+
+def _sha1(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def _fileHash(file_path: str) -> str | None:
+    try:
+        with open(file_path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    trace.count("bytes_read", len(data))
+    return _sha1(data)
+
+
+def _parseDepFile(dep_file: str) -> list[str]:
+    """
+    解析编译器 -MMD 生成的 make 格式依赖文件, 返回其中的头文件
+    """
+    with open(dep_file, "r", encoding="utf-8") as f:
+        text = f.read().replace("\\\n", " ")
+    _, _, deps = text.partition(":")
+    return [dep for dep in shlex.split(deps) if dep.endswith(".h")]
+
+
+class ObjectCache:
+    """
+    目标文件缓存
+    key 由编译器, 编译选项, 工作目录, 源文件路径和内容决定; 命中时再检查记录的头文件hash, 头文件变化视为未命中
+    """
+
+    def __init__(self, cache_dir: str | Path = DEFAULT_CACHE_DIR, compiler: str = None):
+        self.cache_dir = str(cache_dir)
+        self.compiler = compiler or os.environ.get("CC", "cc")
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _key(self, source_file: str, cflags: list[str], cwd: str = None) -> str | None:
+        source_hash = _fileHash(source_file)
+        if source_hash is None:
+            return None
+        # 编译选项中的相对路径 (-Iinclude) 按编译时的工作目录解析, 因此计入工作目录;
+        # #include "x.h" 按源文件所在目录查找, 因此也计入源文件的绝对路径
+        material = json.dumps(
+            [self.compiler, cflags, os.path.abspath(cwd or os.getcwd()), os.path.abspath(source_file), source_hash]
+        )
+        return _sha1(material.encode("utf-8"))
+
+    def getObject(self, source_file: str, cflags: list[str], cwd: str = None) -> tuple[str | None, str]:
+        """
+        返回 (目标文件路径, 编译输出), 编译失败时目标文件路径为None
+        """
+        key = self._key(source_file, cflags, cwd)
+        if key is None:
+            return None, f"文件不存在: {source_file}"
+        obj_file = os.path.join(self.cache_dir, key + ".o")
+        manifest_file = os.path.join(self.cache_dir, key + ".json")
+
+        if os.path.exists(obj_file) and os.path.exists(manifest_file):
+            with open(manifest_file, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if all(_fileHash(path) == digest for path, digest in manifest.items()):
+                trace.count("cache_hits")
+                return obj_file, ""
+        trace.count("cache_misses")
+
+        # 先编译到临时文件再改名, 多个进程同时填充缓存时不会读到半个目标文件
+        fd, tmp_obj = tempfile.mkstemp(suffix=".o", dir=self.cache_dir)
+        os.close(fd)
+        tmp_dep = tmp_obj + ".d"
+        try:
+            ok, output = compileObject(self.compiler, source_file, tmp_obj, cflags + ["-MMD", "-MF", tmp_dep], cwd)
+            if not ok:
+                return None, output
+            headers = _parseDepFile(tmp_dep)
+            base = cwd or os.getcwd()
+            manifest = {
+                os.path.normpath(os.path.join(base, path)): _fileHash(os.path.join(base, path))
+                for path in headers
+            }
+            tmp_manifest = tmp_obj + ".json"
+            with open(tmp_manifest, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False)
+            os.replace(tmp_obj, obj_file)
+            os.replace(tmp_manifest, manifest_file)
+            return obj_file, output
+        finally:
+            for path in (tmp_obj, tmp_dep):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+def compileObject(compiler: str, source_file: str, obj_file: str, cflags: list[str], cwd: str = None) -> tuple[bool, str]:
+    cmd = [compiler, "-c", source_file, "-o", obj_file] + cflags
+    with trace.span("cc.compile", cat="validate", file=source_file):
+        result = subprocess.run(cmd, capture_output=True, text=True, cwd=cwd)
+    return result.returncode == 0, result.stdout + result.stderr
+
+
+def patchFunction(source: str, start_line: int, end_line: int, func_body: str) -> str:
+    """
+    用 func_body 替换 source 中第 start_line 到 end_line 行 (1-based, 含两端)
+    """
+    lines = source.splitlines(keepends=True)
+    if not func_body.endswith("\n"):
+        func_body += "\n"
+    return "".join(lines[: start_line - 1]) + func_body + "".join(lines[end_line:])
+
+
+# 这些选项的参数是路径, 相对路径需要按工程根目录解析
+_PATH_FLAGS = ("-I", "-iquote", "-isystem", "-idirafter", "-include")
+
+
+def absPathFlags(cflags: list[str], root: str) -> list[str]:
+    """
+    把编译选项中的相对路径 (例如 -Iinclude, -include cfg.h) 转换为相对 root 的绝对路径
+    """
+    result = []
+    expect_path = False
+    for flag in cflags:
+        if expect_path:
+            result.append(flag if os.path.isabs(flag) else os.path.join(root, flag))
+            expect_path = False
+            continue
+        if flag in _PATH_FLAGS:
+            result.append(flag)
+            expect_path = True
+            continue
+        for prefix in _PATH_FLAGS:
+            if flag.startswith(prefix) and len(flag) > len(prefix):
+                path = flag[len(prefix) :]
+                if not os.path.isabs(path):
+                    flag = prefix + os.path.join(root, path)
+                break
+        result.append(flag)
+    return result
+
+
+def locateFunctions(source_file: str, cflags: list[str], root: str) -> dict[str, tuple[int, int]]:
+    """
+    用 libclang 找到文件中所有函数定义的起止行号, 返回 函数名 -> (起始行, 结束行)
+    libclang 按当前进程的工作目录解析相对路径, 因此先把编译选项中的路径转为相对 root 的绝对路径
+    """
+    import clang.cindex
+    from findDiffFunc.findDiffFunc import getFuncExtentsInTU
+
+    index = clang.cindex.Index.create()
+    with trace.span("libclang.parse", file=source_file):
+        tu = index.parse(source_file, args=absPathFlags(cflags, root))
+    trace.count("files_parsed")
+    return {
+        name: (start_line, end_line)
+        for name, start_line, end_line in getFuncExtentsInTU(tu, source_file, only_definition=True)
+    }
+
+
+def _killTree(proc: subprocess.Popen) -> None:
+    """
+    杀掉测试进程及其子进程
+    POSIX 上测试进程是新会话的首进程, 直接杀进程组; Windows 上用 taskkill /T 结束进程树
+    """
+    if os.name == "posix":
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        return
+    subprocess.run(
+        ["taskkill", "/F", "/T", "/PID", str(proc.pid)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    # taskkill 不可用或失败时, 至少结束测试进程本身
+    if proc.poll() is None:
+        proc.kill()
+
+
+def _runSandboxed(cmd: list[str], cwd: str, timeout: float) -> tuple[int | None, str]:
+    """
+    在 cwd 中运行测试, 超时后杀掉整个进程树, 超时返回 (None, 输出)
+    """
+    env = {
+        "PATH": os.environ.get("PATH", ""),
+        "HOME": cwd,
+        "TMPDIR": cwd,
+        "TEMP": cwd,
+        "TMP": cwd,
+        "LANG": "C",
+    }
+    if os.name == "posix":
+        popen_kwargs = {"start_new_session": True}
+    else:
+        # Windows 上缺少 SYSTEMROOT 时很多程序无法启动
+        env["SYSTEMROOT"] = os.environ.get("SYSTEMROOT", "")
+        popen_kwargs = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    proc = subprocess.Popen(
+        cmd,
+        cwd=cwd,
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        **popen_kwargs,
+    )
+    try:
+        output, _ = proc.communicate(timeout=timeout)
+        return proc.returncode, output.decode("utf-8", errors="replace")
+    except subprocess.TimeoutExpired:
+        _killTree(proc)
+        output, _ = proc.communicate()
+        return None, output.decode("utf-8", errors="replace")
+
+
+class Validator:
+    """
+    对一组修复候选执行 编译 -> 链接 -> 运行单元测试
+    """
+
+    def __init__(self, project: dict, cache: ObjectCache = None, jobs: int = None):
+        self.root = os.path.abspath(project.get("root", "."))
+        self.sources = [os.path.join(self.root, p) for p in project.get("sources", [])]
+        self.test_sources = [os.path.join(self.root, p) for p in project.get("test_sources", [])]
+        self.cflags = list(project.get("cflags", []))
+        self.ldflags = list(project.get("ldflags", []))
+        self.test_args = list(project.get("test_args", []))
+        self.timeout = float(project.get("timeout", 10))
+        self.cache = cache or ObjectCache()
+        self.jobs = jobs or os.cpu_count() or 1
+        self.objects: dict[str, str] = {}
+        self._extents: dict[str, dict[str, tuple[int, int]]] = {}
+        self._extents_lock = threading.Lock()
+
+    def prepare(self) -> dict[str, str]:
+        """
+        并行编译 (或从缓存取出) 所有源文件和测试文件的目标文件, 返回编译失败的文件及其输出
+        """
+        errors = {}
+        with trace.span("validate.prepare", cat="validate"):
+            with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+                futures = {
+                    pool.submit(self.cache.getObject, path, self.cflags, self.root): path
+                    for path in self.sources + self.test_sources
+                }
+                for future in as_completed(futures):
+                    path = futures[future]
+                    obj_file, output = future.result()
+                    if obj_file is None:
+                        errors[path] = output
+                    else:
+                        self.objects[path] = obj_file
+        return errors
+
+    def _extent(self, candidate: dict, source_file: str) -> tuple[int, int] | None:
+        if "start_line" in candidate and "end_line" in candidate:
+            return int(candidate["start_line"]), int(candidate["end_line"])
+        # 按文件缓存函数表, 同一文件的多个候选只解析一次, 同时避免多个线程并发调用 libclang
+        with self._extents_lock:
+            if source_file not in self._extents:
+                self._extents[source_file] = locateFunctions(source_file, self.cflags, self.root)
+            return self._extents[source_file].get(candidate["func_name"])
+
+    def validate(self, candidate: dict) -> dict:
+        """
+        验证一个候选, 返回结构化的结果记录
+        """
+        start = time.perf_counter()
+        record = {"id": candidate.get("id"), "status": "error", "returncode": None, "output": ""}
+        source_file = os.path.join(self.root, candidate["file"])
+
+        with trace.span("validate.candidate", cat="validate", id=candidate.get("id")):
+            extent = self._extent(candidate, source_file)
+            if extent is None:
+                record["output"] = f"未找到函数 {candidate['func_name']}"
+                return self._finish(record, start)
+
+            with open(source_file, "r", encoding="utf-8") as f:
+                source = f.read()
+            patched = patchFunction(source, extent[0], extent[1], candidate["func_body"])
+
+            with tempfile.TemporaryDirectory(prefix="llmtest-validate-") as work_dir:
+                patched_file = os.path.join(work_dir, os.path.basename(source_file))
+                with open(patched_file, "w", encoding="utf-8") as f:
+                    f.write(patched)
+
+                # 补丁文件不在原目录, 用 -iquote 保证 #include "xxx.h" 仍能找到原目录的头文件
+                cflags = self.cflags + ["-iquote", os.path.dirname(source_file)]
+                patched_obj = os.path.join(work_dir, "patched.o")
+                ok, output = compileObject(self.cache.compiler, patched_file, patched_obj, cflags, self.root)
+                if not ok:
+                    record["status"] = "compile_error"
+                    record["output"] = output
+                    return self._finish(record, start)
+
+                objects = [
+                    obj for path, obj in self.objects.items() if os.path.normpath(path) != os.path.normpath(source_file)
+                ]
+                exe_file = os.path.join(work_dir, "unit_test")
+                link_cmd = [self.cache.compiler, patched_obj] + objects + ["-o", exe_file] + self.ldflags
+                with trace.span("cc.link", cat="validate"):
+                    result = subprocess.run(link_cmd, capture_output=True, text=True, cwd=work_dir)
+                if result.returncode != 0:
+                    record["status"] = "link_error"
+                    record["output"] = result.stdout + result.stderr
+                    return self._finish(record, start)
+
+                with trace.span("validate.test", cat="validate"):
+                    returncode, output = _runSandboxed([exe_file] + self.test_args, work_dir, self.timeout)
+                record["returncode"] = returncode
+                record["output"] = output
+                if returncode is None:
+                    record["status"] = "timeout"
+                else:
+                    record["status"] = "pass" if returncode == 0 else "fail"
+                return self._finish(record, start)
+
+    def _finish(self, record: dict, start: float) -> dict:
+        record["duration"] = round(time.perf_counter() - start, 3)
+        record["output"] = record["output"][-OUTPUT_TAIL:]
+        trace.count(f"validate_{record['status']}")
+        return record
+
+    def validateAll(self, candidates):
+        """
+        并行验证所有候选, 按完成顺序逐个产出结果记录
+        """
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            futures = {pool.submit(self.validate, c): c for c in candidates}
+            for future in as_completed(futures):
+                try:
+                    yield future.result()
+                except Exception as e:
+                    yield {
+                        "id": futures[future].get("id"),
+                        "status": "error",
+                        "returncode": None,
+                        "duration": None,
+                        "output": f"{type(e).__name__}: {e}",
+                    }
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="并行编译并运行修复候选的单元测试")
+    parser.add_argument("project", help="工程配置 JSON 文件")
+    parser.add_argument("candidates", help="候选 JSON Lines 文件, - 表示标准输入")
+    parser.add_argument("--jobs", type=int, default=None, help="并行数, 默认为 CPU 核数")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="目标文件缓存目录")
+    parser.add_argument("--cc", default=None, help="编译器, 默认取环境变量 CC 或 cc")
+    args = parser.parse_args(argv)
+
+    with open(args.project, "r", encoding="utf-8") as f:
+        project = json.load(f)
+    # 配置中的 root 相对于配置文件所在目录
+    project["root"] = os.path.join(os.path.dirname(os.path.abspath(args.project)), project.get("root", "."))
+    if args.candidates == "-":
+        candidates = [json.loads(line) for line in sys.stdin if line.strip()]
+    else:
+        with open(args.candidates, "r", encoding="utf-8") as f:
+            candidates = [json.loads(line) for line in f if line.strip()]
+
+    validator = Validator(project, ObjectCache(args.cache_dir, args.cc), args.jobs)
+    errors = validator.prepare()
+    if errors:
+        for path, output in errors.items():
+            print(f"编译失败: {path}\n{output}", file=sys.stderr)
+        return 1
+
+    for record in validator.validateAll(candidates):
+        print(json.dumps(record, ensure_ascii=False), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
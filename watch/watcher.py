@@ -0,0 +1,278 @@
+"""监视模式: 源码或报告变化时, 增量地重新提取函数并生成带注释的函数和提示词.
+
+只依赖轮询 (mtime/大小 + 内容hash), 不需要 inotify 等平台相关接口.
+每轮只重新解析内容真正发生变化的文件 (及包含了变化头文件的文件),
+并且只重写受影响函数的输出.
+
+用法:
+    python watch/watcher.py CFile --report mock_report.html --out extracted
+
+输出目录中每个存在告警的函数对应两个文件:
+    <相对路径>.<函数名>.c          在告警行末尾插入了错误代号注释的函数代码
+    <相对路径>.<函数名>.prompt.md  修复提示词
+注释只插入到提取出的函数副本中, 不修改原始文件, 否则会触发新一轮变化.
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+from pathlib import Path
+
+if __package__ in (None, ""):
+    # 以脚本方式运行 (python watch/watcher.py) 时仓库根目录不在 sys.path 中
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llmtest_perf import trace
+from a import parse_html_report_all
+from astDaemon.cache import TUCache, funcAtLine
+
+SOURCE_SUFFIXES = (".c", ".h")
+
+
+def _hashFile(file_path: str) -> str | None:
+    try:
+        with open(file_path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    trace.count("bytes_read", len(data))
+    return hashlib.sha1(data).hexdigest()
+
+
+def annotateFunc(func_info: dict, findings: list[dict]) -> str:
+    """
+    在函数代码中每个告警行的末尾插入 // 错误代号 注释
+    """
+    lines = func_info["func_body"].splitlines(keepends=True)
+    codes_by_line: dict[int, list[str]] = {}
+    for finding in findings:
+        codes_by_line.setdefault(finding["line_number"], []).append(finding["error_code"])
+
+    for line_number, codes in codes_by_line.items():
+        offset = line_number - func_info["start_line"]
+        if 0 <= offset < len(lines):
+            line = lines[offset]
+            ending = line[len(line.rstrip("\r\n")) :]
+            lines[offset] = line.rstrip("\r\n") + " // " + ", ".join(codes) + ending
+    return "".join(lines)
+
+
+def buildRepairPrompt(file_path: str, func_info: dict, findings: list[dict]) -> str:
+    """
+    根据函数代码和告警信息生成修复提示词
+    """
+    finding_lines = "\n".join(
+        f"- 第 {f['line_number']} 行: {f['error_code']}" for f in findings
+    )
+    return (
+        f"以下是文件 `{file_path}` 中的函数 `{func_info['func_name']}` "
+        f"(第 {func_info['start_line']}-{func_info['end_line']} 行), "
+        f"静态分析在其中报告了以下问题:\n\n"
+        f"{finding_lines}\n\n"
+        f"告警行已用注释标出. 请在不改变函数功能的前提下修复这些问题, 只输出修复后的完整函数.\n\n"
+        f"```c\n{annotateFunc(func_info, findings)}```\n"
+    )
+
+
+class Watcher:
+    """
+    轮询源码树和报告文件, 维护 文件 -> 告警 的映射以及已输出函数的状态
+    """
+
+    def __init__(
+        self,
+        root: str | Path,
+        report_file: str | Path,
+        out_dir: str | Path,
+        cache: TUCache = None,
+    ):
+        self.root = os.path.abspath(root)
+        self.report_file = os.path.abspath(report_file)
+        self.out_dir = os.path.abspath(out_dir)
+        self.cache = cache or TUCache()
+        self.snapshot: dict[str, tuple[int, int]] = {}
+        self.hashes: dict[str, str] = {}
+        self.findings: dict[str, list[dict]] = {}
+        # (文件, 函数名) -> (函数hash, 告警), 用于判断输出是否需要重写
+        self.emitted: dict[tuple[str, str], tuple] = {}
+        # 文件 -> 它包含的头文件, 独立于 TUCache 保存, TU 被 LRU 淘汰后仍能发现头文件的修改
+        self.deps: dict[str, set[str]] = {}
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        snapshot = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [
+                d
+                for d in dirnames
+                if not d.startswith(".") and os.path.join(dirpath, d) != self.out_dir
+            ]
+            for name in filenames:
+                if name.endswith(SOURCE_SUFFIXES):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    snapshot[path] = (st.st_mtime_ns, st.st_size)
+        try:
+            st = os.stat(self.report_file)
+            snapshot[self.report_file] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            pass
+        return snapshot
+
+    def _changedFiles(self) -> set[str]:
+        """
+        对比上一轮的快照, 返回内容真正发生变化 (含新增和删除) 的文件
+        只有 mtime 或大小变化的文件才会重新计算hash
+        """
+        snapshot = self._scan()
+        changed = set()
+        for path, stat in snapshot.items():
+            if self.snapshot.get(path) == stat:
+                continue
+            digest = _hashFile(path)
+            if digest != self.hashes.get(path):
+                changed.add(path)
+            self.hashes[path] = digest
+        for path in self.snapshot.keys() - snapshot.keys():
+            changed.add(path)
+            self.hashes.pop(path, None)
+        self.snapshot = snapshot
+        return changed
+
+    def _loadFindings(self) -> dict[str, list[dict]]:
+        report_dir = os.path.dirname(self.report_file)
+        findings: dict[str, list[dict]] = {}
+        for finding in parse_html_report_all(self.report_file):
+            path = finding["file_path"]
+            if not os.path.isabs(path):
+                # 报告中的相对路径先按源码根目录解析, 不存在时再按报告所在目录解析
+                candidate = os.path.join(self.root, path)
+                if not os.path.exists(candidate):
+                    candidate = os.path.join(report_dir, path)
+                path = candidate
+            findings.setdefault(os.path.normpath(path), []).append(finding)
+        return findings
+
+    def pollOnce(self) -> list[str]:
+        """
+        执行一轮检查, 返回本轮写入或删除的输出文件
+        """
+        with trace.span("watch.poll", cat="watch"):
+            changed = self._changedFiles()
+            if not changed:
+                return []
+
+            affected = set()
+            if self.report_file in changed:
+                new_findings = self._loadFindings()
+                for path in self.findings.keys() | new_findings.keys():
+                    if self.findings.get(path) != new_findings.get(path):
+                        affected.add(path)
+                self.findings = new_findings
+
+            changed_headers = {p for p in changed if p.endswith(".h")}
+            for path in self.findings:
+                if path in changed:
+                    affected.add(path)
+                elif changed_headers:
+                    # 还没解析过的文件不知道依赖哪些头文件, 按受影响处理
+                    deps = self.deps.get(path)
+                    if deps is None or deps & changed_headers:
+                        affected.add(path)
+
+            written = []
+            for path in sorted(affected):
+                try:
+                    with trace.span("watch.extract", cat="watch", file=path):
+                        written.extend(self._reextract(path))
+                except Exception as e:
+                    # 单个文件出错 (解码失败, 解析失败, 检查后被删除等) 不能结束监视;
+                    # 忘掉它的快照和hash, 下一轮会把它当作变化的文件重试
+                    print(f"错误: 处理 {path} 失败: {type(e).__name__}: {e}", file=sys.stderr)
+                    self.snapshot.pop(path, None)
+                    self.hashes.pop(path, None)
+            return written
+
+    def _reextract(self, file_path: str) -> list[str]:
+        findings = self.findings.get(file_path, [])
+        funcs: dict[str, tuple[dict, list[dict]]] = {}
+        if findings and os.path.exists(file_path):
+            entry = self.cache.get(file_path)
+            self.deps[file_path] = {os.path.normpath(os.path.abspath(dep)) for dep in entry.deps}
+            for finding in findings:
+                func_info = funcAtLine(entry, finding["line_number"])
+                if func_info is None:
+                    print(f"警告: {file_path}:{finding['line_number']} 不在任何函数内")
+                    continue
+                funcs.setdefault(func_info["func_name"], (func_info, []))[1].append(finding)
+        else:
+            self.deps.pop(file_path, None)
+
+        written = []
+        for func_name, (func_info, func_findings) in funcs.items():
+            key = (file_path, func_name)
+            state = (
+                func_info["func_hash"],
+                func_info["start_line"],
+                tuple((f["line_number"], f["error_code"]) for f in func_findings),
+            )
+            if self.emitted.get(key) == state:
+                continue
+            code_file, prompt_file = self._outputPaths(file_path, func_name)
+            os.makedirs(os.path.dirname(code_file), exist_ok=True)
+            with open(code_file, "w", encoding="utf-8") as f:
+                f.write(annotateFunc(func_info, func_findings))
+            with open(prompt_file, "w", encoding="utf-8") as f:
+                f.write(buildRepairPrompt(os.path.relpath(file_path, self.root), func_info, func_findings))
+            self.emitted[key] = state
+            written.extend([code_file, prompt_file])
+
+        # 删除不再有告警的函数的输出
+        for key in [k for k in self.emitted if k[0] == file_path and k[1] not in funcs]:
+            del self.emitted[key]
+            for path in self._outputPaths(*key):
+                if os.path.exists(path):
+                    os.remove(path)
+                    written.append(path)
+        return written
+
+    def _outputPaths(self, file_path: str, func_name: str) -> tuple[str, str]:
+        rel_path = os.path.relpath(file_path, self.root)
+        if rel_path.startswith(".."):
+            rel_path = os.path.basename(file_path)
+        base = os.path.join(self.out_dir, f"{rel_path}.{func_name}")
+        return base + ".c", base + ".prompt.md"
+
+    def run(self, interval: float = 0.5) -> None:
+        while True:
+            start = time.perf_counter()
+            written = self.pollOnce()
+            if written:
+                elapsed = (time.perf_counter() - start) * 1000
+                print(f"更新了 {len(written)} 个文件, 耗时 {elapsed:.1f} ms")
+                for path in written:
+                    print(f"  {os.path.relpath(path)}")
+            time.sleep(interval)
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="监视源码树, 增量地重新提取函数并生成提示词")
+    parser.add_argument("root", help="源码根目录")
+    parser.add_argument("--report", required=True, help="HTML 测试报告路径")
+    parser.add_argument("--out", default="extracted", help="输出目录")
+    parser.add_argument("--interval", type=float, default=0.5, help="轮询间隔 (秒)")
+    args = parser.parse_args(argv)
+
+    watcher = Watcher(args.root, args.report, args.out)
+    try:
+        watcher.run(args.interval)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())